@@ -0,0 +1,194 @@
+import numpy as np
+
+from kernel import HAS_NUMBA, compiled_trip_kernel
+from real import (ShuttleBusSimulation, ARRIVAL_PROBS, DEPART_PROBS, TRAVEL_TIME_DISTRIBUTIONS,
+                  BACK_TO_START_DISTRIBUTION, STOP_TIME_PER_PASSENGER)
+
+
+def draw_trip_inputs(num_replicas, num_stops=9, travel_time_distributions=None,
+                     back_to_start_distribution=None, random_state=None):
+    """
+    Pre-draw the random inputs for many replicas of one trip.
+
+    Passenger counts are stored as uniforms so the same draws can be turned into counts for any
+    arrival/departure probabilities (common random numbers across parameter settings).
+
+    Args:
+        num_replicas (int): Number of trips to draw.
+        num_stops (int): Number of stops per trip.
+        travel_time_distributions (list): Frozen scipy distributions for legs 1_to_2 ... 9_to_1.
+        back_to_start_distribution: Frozen scipy distribution for the trip back to stop 1.
+        random_state: Seed or numpy Generator.
+
+    Returns:
+        dict: "arrival_u", "depart_u", "travel" of shape (num_replicas, num_stops) and "back" of shape (num_replicas,).
+    """
+    travel_time_distributions = travel_time_distributions or TRAVEL_TIME_DISTRIBUTIONS
+    back_to_start_distribution = back_to_start_distribution or BACK_TO_START_DISTRIBUTION
+    rng = np.random.default_rng(random_state)
+
+    travel = np.empty((num_replicas, num_stops))
+    for i in range(num_stops - 1):
+        travel[:, i] = travel_time_distributions[i].rvs(size=num_replicas, random_state=rng)
+    # The last stop's leg is the trip back to the first stop, as in ShuttleBusSimulation.simulate_travel
+    travel[:, num_stops - 1] = back_to_start_distribution.rvs(size=num_replicas, random_state=rng)
+
+    return {
+        "arrival_u": rng.random((num_replicas, num_stops)),
+        "depart_u": rng.random((num_replicas, num_stops)),
+        "travel": travel,
+        "back": back_to_start_distribution.rvs(size=num_replicas, random_state=rng),
+    }
+
+
+def passenger_counts(uniforms, probs):
+    """
+    Turn uniforms into geometric passenger counts (same support as geom.rvs) by inversion.
+
+    Args:
+        uniforms (np.ndarray): Uniform draws, (..., num_stops).
+        probs (array-like): Geometric p per stop, broadcastable against uniforms.
+
+    Returns:
+        np.ndarray: Integer passenger counts.
+    """
+    with np.errstate(divide="ignore"):  # p = 1 gives log1p(-p) = -inf, i.e. always one passenger
+        counts = np.ceil(np.log1p(-uniforms) / np.log1p(-np.asarray(probs, dtype=float)))
+    return np.maximum(counts, 1).astype(np.int64)
+
+
+BACKENDS = ["auto", "numpy", "jit"]
+
+
+def resolve_backend(backend="auto"):
+    """
+    Pick the trip kernel backend at runtime: "auto" uses "jit" when Numba is installed, else "numpy".
+    Without Numba, "jit" still works and runs the same kernel as plain Python.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "auto":
+        return "jit" if HAS_NUMBA else "numpy"
+    return backend
+
+
+def simulate_trips(arrivals, departs, travel, bus_capacity=40, backend="numpy"):
+    """
+    Run the per-stop recurrence of ShuttleBusSimulation.simulate_stop for many trips at once.
+
+    The "numpy" backend processes stops in order with every operation vectorized over the trips
+    (rows); the "jit" backend runs kernel.trip_kernel, compiled with Numba when available.
+
+    Args:
+        arrivals (np.ndarray): Passengers wanting to board, (num_trips, num_stops).
+        departs (np.ndarray): Passengers wanting to alight, (num_trips, num_stops).
+        travel (np.ndarray): Travel time after each stop, (num_trips, num_stops).
+        bus_capacity (int or np.ndarray): Capacity, scalar or per trip.
+        backend (str): One of BACKENDS.
+
+    Returns:
+        dict: "boarded", "alighted", "stop_time", "travel_time", "overflow", each (num_trips, num_stops).
+    """
+    num_trips, num_stops = arrivals.shape
+    bus_capacity = np.broadcast_to(bus_capacity, (num_trips,))
+    if np.any(np.mod(bus_capacity, 1) != 0):
+        raise ValueError("bus_capacity must be a whole number of passengers")
+    bus_capacity = bus_capacity.astype(np.int64)
+
+    boarded = np.empty((num_trips, num_stops), dtype=np.int64)
+    alighted = np.empty((num_trips, num_stops), dtype=np.int64)
+    overflow = np.empty((num_trips, num_stops), dtype=np.int64)
+    stop_time = np.empty((num_trips, num_stops))
+
+    if resolve_backend(backend) == "jit":
+        compiled_trip_kernel(np.ascontiguousarray(arrivals, dtype=np.int64),
+                             np.ascontiguousarray(departs, dtype=np.int64),
+                             bus_capacity, boarded, alighted, stop_time, overflow)
+    else:
+        passengers = np.zeros(num_trips, dtype=np.int64)
+        for i in range(num_stops):
+            overflow[:, i] = np.maximum(0, passengers + arrivals[:, i] - bus_capacity)
+            boarded[:, i] = arrivals[:, i] - overflow[:, i]
+            passengers += boarded[:, i]
+
+            alighted[:, i] = np.minimum(passengers, departs[:, i])
+            passengers -= alighted[:, i]
+
+            stop_time[:, i] = STOP_TIME_PER_PASSENGER * (boarded[:, i] + alighted[:, i])
+
+        # For stop 1, force alighting passengers to 0
+        alighted[:, 0] = 0
+
+    return {
+        "boarded": boarded,
+        "alighted": alighted,
+        "stop_time": stop_time,
+        "travel_time": np.asarray(travel, dtype=float),
+        "overflow": overflow,
+    }
+
+
+def trip_times(trips):
+    """
+    Time from departure until the bus is back at stop 1, excluding the extra "Back to Start" leg.
+    """
+    return (trips["stop_time"] + trips["travel_time"]).sum(axis=1)
+
+
+def run_batch(num_replicas, arrival_probs=None, depart_probs=None, bus_capacity=40, random_state=None,
+              backend="numpy"):
+    """
+    Simulate num_replicas trips of the final/real.py model in one vectorized pass.
+
+    Returns:
+        dict: Output of simulate_trips plus "back" (travel time of the Back to Start leg).
+    """
+    arrival_probs = ARRIVAL_PROBS if arrival_probs is None else arrival_probs
+    depart_probs = DEPART_PROBS if depart_probs is None else depart_probs
+    draws = draw_trip_inputs(num_replicas, num_stops=len(arrival_probs), random_state=random_state)
+
+    trips = simulate_trips(
+        passenger_counts(draws["arrival_u"], arrival_probs),
+        passenger_counts(draws["depart_u"], depart_probs),
+        draws["travel"],
+        bus_capacity=bus_capacity,
+        backend=backend,
+    )
+    trips["back"] = draws["back"]
+    return trips
+
+
+def check_backends(num_trips=2000, bus_capacity=40, random_state=None):
+    """
+    Check that every backend gives exactly the results of ShuttleBusSimulation.simulate_stop and
+    simulate_travel when fed the same arrival, departure and travel arrays. Arrivals are scaled up
+    for part of the trips so that the overflow branch is exercised.
+
+    Raises:
+        AssertionError: If any backend differs from the reference engine.
+    """
+    draws = draw_trip_inputs(num_trips, random_state=random_state)
+    arrivals = passenger_counts(draws["arrival_u"], ARRIVAL_PROBS)
+    arrivals[::4] *= 5
+    departs = passenger_counts(draws["depart_u"], DEPART_PROBS)
+    travel = draws["travel"]
+    num_stops = arrivals.shape[1]
+
+    simulation = ShuttleBusSimulation(num_stops=num_stops, bus_capacity=bus_capacity)
+    reference = {key: np.empty((num_trips, num_stops))
+                 for key in ["boarded", "alighted", "stop_time", "overflow", "travel_time"]}
+    for t in range(num_trips):
+        simulation.arrival_distributions = [(lambda n: lambda: n)(int(n)) for n in arrivals[t]]
+        simulation.depart_distributions = [(lambda n: lambda: n)(int(n)) for n in departs[t]]
+        simulation.travel_time_distributions = [(lambda x: lambda: x)(float(x)) for x in travel[t]]
+        simulation.back_to_start_distribution = (lambda x: lambda: x)(float(travel[t, -1]))
+        simulation.passengers = 0
+        for stop in range(1, num_stops + 1):
+            stop_result = {**simulation.simulate_stop(stop), "travel_time": simulation.simulate_travel(stop)}
+            for key in reference:
+                reference[key][t, stop - 1] = stop_result[key]
+
+    for backend in ["numpy", "jit"]:
+        trips = simulate_trips(arrivals, departs, travel, bus_capacity=bus_capacity, backend=backend)
+        for key, values in reference.items():
+            assert np.array_equal(trips[key], values), f"{backend} backend differs from the reference in {key}"
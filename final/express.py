@@ -1,9 +1,12 @@
 import numpy as np
 from scipy.stats import invgauss, burr, cauchy, norm, genpareto, logistic, genextreme, geom
 
+from sketch import TailMetrics
+
 class ShuttleBusSimulation:
     def __init__(self, num_stops=9, selected_stops=None, express_stops=None, arrival_distributions=None, 
-                 depart_distributions=None, stop_time_distributions=None, travel_time_distributions=None, bus_capacity=40):
+                 depart_distributions=None, stop_time_distributions=None, travel_time_distributions=None, bus_capacity=40,
+                 keep_results=True):
         self.num_stops = num_stops
         self.selected_stops = selected_stops if selected_stops else list(range(1, num_stops + 1))
         self.express_stops = express_stops if express_stops else []
@@ -31,7 +34,11 @@ class ShuttleBusSimulation:
         self.back_to_start_distribution = lambda: genextreme.rvs(c=0.3512, loc=78.031, scale=5.9755)
         self.bus_capacity = bus_capacity
 
+        self.keep_results = keep_results  # False keeps only the streaming tail metrics, in constant memory
         self.results = []  # List to store results for each bus trip
+        self.checkpoints = []  # Per-trip state before each stop (seeded runs only), aligned with self.results
+        self.tail_metrics = TailMetrics(num_stops=num_stops)  # Updated as each trip finishes
+        self.tail_metrics_stale = False  # Set by resimulate_from_stop; rebuilt from self.results when next summarized
         self.passengers = 0
 
     def adjust_probabilities(self, original_probs, old_interval, new_interval):
@@ -101,13 +108,30 @@ class ShuttleBusSimulation:
             travel_time += travel_time_distribution()
         return travel_time
 
-    def run_trip(self, start_time, express=False):
-        trip_results = []
-        current_time = start_time
-        stops = self.express_stops if express else self.selected_stops
+    def seed_stop(self, trip_key, stop_number):
+        """
+        Seed the random stream for one stop of one trip (common random numbers).
+
+        Args:
+            trip_key (list): Identifies the trip, e.g. [seed, replica, departure_time]. None disables seeding.
+            stop_number (int): Stop whose draws are about to be made.
+        """
+        if trip_key is not None:
+            np.random.seed([*trip_key, stop_number])
+
+    def trip_stops(self, express=False):
+        return self.express_stops if express else self.selected_stops
 
-        for i in range(len(stops)):
+    def run_stops(self, trip_results, checkpoint, current_time, first_index):
+        stops = self.trip_stops(checkpoint["express"])
+
+        for i in range(first_index, len(stops)):
             stop = stops[i]
+            # Checkpoint the trip state before this stop so a later change here can resume from it
+            if checkpoint["trip_key"] is not None:
+                checkpoint["states"].append({"passengers": self.passengers, "time": current_time})
+            self.seed_stop(checkpoint["trip_key"], stop)
+
             stop_result = self.simulate_stop(stop)
 
             # Calculate travel time to the next stop if applicable
@@ -127,6 +151,7 @@ class ShuttleBusSimulation:
             current_time += stop_result["stop_time"] + travel_time
 
         # Add travel time back to the first stop
+        self.seed_stop(checkpoint["trip_key"], self.num_stops + 1)
         travel_time_back = self.simulate_travel(stops[-1], self.num_stops + 1)
         trip_results.append({
             "stop": "Back to Start",
@@ -138,17 +163,88 @@ class ShuttleBusSimulation:
             "overflow": 0
         })
 
-        self.results.append(trip_results)
+    def trip_time(self, trip_results):
+        """
+        Seconds from departure until the bus is back at stop 1. The last served stop has no travel
+        time; the leg back to stop 1 is the "Back to Start" row's travel time.
+        """
+        return trip_results[-1]["time"] + trip_results[-1]["travel_time"] - trip_results[0]["time"]
+
+    def run_trip(self, start_time, express=False, trip_key=None):
+        trip_results = []
+        checkpoint = {"trip_key": trip_key, "express": express, "states": []}
+        self.run_stops(trip_results, checkpoint, start_time, 0)
+
+        if not self.tail_metrics_stale:  # A stale digest is rebuilt from self.results, which includes this trip
+            self.tail_metrics.add_trip(trip_results, self.trip_time(trip_results))
+        if self.keep_results:
+            self.results.append(trip_results)
+            self.checkpoints.append(checkpoint)
 
-    def run(self, start_time, end_time, headway_minutes, num_simulations=1, express=False):
-        for _ in range(num_simulations):
-            headway_seconds = headway_minutes * 60
-            current_time = start_time
+    def run(self, start_time, end_time, headway_minutes, num_simulations=1, express=False, seed=None):
+        """
+        Simulate every departure in a service window.
 
-            while current_time <= end_time:
-                self.passengers = 0  # Reset passengers for each trip
-                self.run_trip(current_time, express=express)
-                current_time += headway_seconds
+        Args:
+            start_time (int): First departure in seconds.
+            end_time (int): Last possible departure in seconds.
+            headway_minutes (float): Minutes between departures.
+            num_simulations (int): Number of replicas per departure.
+            express (bool): Run the express stop pattern instead of the selected stops.
+            seed (int): If given, each (replica, departure, stop) draws from its own seeded stream so that
+                resimulate_from_stop reproduces unchanged stops exactly (common random numbers).
+        """
+        random_state = np.random.get_state()  # seed_stop reseeds the global stream; restored below
+        try:
+            for replica in range(num_simulations):
+                headway_seconds = headway_minutes * 60
+                current_time = start_time
+
+                while current_time <= end_time:
+                    self.passengers = 0  # Reset passengers for each trip
+                    trip_key = None if seed is None else [seed, replica, int(current_time), int(express)]
+                    self.run_trip(current_time, express=express, trip_key=trip_key)
+                    current_time += headway_seconds
+        finally:
+            # Later unseeded draws continue from where they were, not from the last per-stop seed
+            if seed is not None:
+                np.random.set_state(random_state)
+
+    def resimulate_from_stop(self, stop_number):
+        """
+        Re-run all stored trips from the given stop onwards, reusing the checkpointed prefix.
+
+        Call this after changing the parameters of a single stop. Arrival/departure changes at stop k
+        and the leg k_to_k+1 both take effect from the last served stop at or before k, since that
+        stop's travel time covers every leg up to the next served stop.
+
+        Args:
+            stop_number (int): First stop whose results may change, 1..num_stops + 1 (the latter for
+                the leg back to stop 1).
+        """
+        if not 1 <= stop_number <= self.num_stops + 1:
+            raise ValueError(f"stop_number must be between 1 and {self.num_stops + 1}, got {stop_number}")
+        if not self.keep_results:
+            raise ValueError("resimulate_from_stop needs the stored trips (keep_results=True)")
+        if any(checkpoint["trip_key"] is None for checkpoint in self.checkpoints):
+            raise ValueError("resimulate_from_stop needs trips run with a seed (run(..., seed=...))")
+
+        random_state = np.random.get_state()  # seed_stop reseeds the global stream; restored below
+        try:
+            for trip_results, checkpoint in zip(self.results, self.checkpoints):
+                stops = self.trip_stops(checkpoint["express"])
+                first_index = max([i for i, stop in enumerate(stops) if stop <= stop_number], default=0)
+                state = checkpoint["states"][first_index]
+                del trip_results[first_index:]
+                del checkpoint["states"][first_index:]
+
+                self.passengers = state["passengers"]
+                self.run_stops(trip_results, checkpoint, state["time"], first_index)
+        finally:
+            np.random.set_state(random_state)
+
+        # The digests cannot drop the old trips; rebuild them only when they are next summarized
+        self.tail_metrics_stale = True
 
     def summarize_results_by_departure_time(self):
         results_by_departure = {}
@@ -188,6 +284,19 @@ class ShuttleBusSimulation:
 
         return formatted_results
 
+    def summarize_tail_metrics_by_departure_time(self, quantiles=(0.9, 0.95, 0.99)):
+        """
+        Tail quantiles of trip time, elapsed time and stop time, and overflow probabilities, per
+        departure time slot (see sketch.TailMetrics.summary for the format). The digests are updated
+        as each trip finishes, so this also works with keep_results=False.
+        """
+        if self.tail_metrics_stale:
+            self.tail_metrics = TailMetrics(num_stops=self.num_stops)
+            for trip_results in self.results:
+                self.tail_metrics.add_trip(trip_results, self.trip_time(trip_results))
+            self.tail_metrics_stale = False
+        return self.tail_metrics.summary(quantiles)
+
 # Example usage of the updated simulation
 simulation = ShuttleBusSimulation(num_stops=9, selected_stops=[1, 2, 3, 4, 5, 6, 7, 8, 9], express_stops=[1, 3, 5, 7, 9], bus_capacity=40)
 
@@ -220,3 +329,11 @@ for time_label, stops_data in results_by_time.items():
     for stop_data in stops_data:
         print(f"{stop_data['stop']:>6} | {stop_data['avg_boarded']:>14.2f} | {stop_data['avg_alighted']:>14.2f} | "
               f"{stop_data['avg_stop_time']:>14.2f} | {stop_data['avg_travel_time']:>14} | {stop_data['avg_overflow']:>14.2f}")
+
+# Tail metrics for service guarantees
+tail_by_time = simulation.summarize_tail_metrics_by_departure_time()
+for time_label, tail_data in tail_by_time.items():
+    trip_time = tail_data["trip_time"]
+    print(f"\n===== {time_label} 시간대 꼬리 지표 =====")
+    print(f"운행 시간 p90/p95/p99: {trip_time[0.9]:.1f} / {trip_time[0.95]:.1f} / {trip_time[0.99]:.1f}, "
+          f"초과 인원 발생 확률: {tail_data['overflow_prob']:.3f}")
@@ -0,0 +1,36 @@
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; trip_kernel then runs as plain Python
+    njit = None
+
+from real import STOP_TIME_PER_PASSENGER
+
+
+def trip_kernel(arrivals, departs, bus_capacity, boarded, alighted, stop_time, overflow):
+    """
+    Scalar version of the ShuttleBusSimulation.simulate_stop recurrence, one trip (row) at a time.
+
+    Only arrays and scalars are used so the same source compiles with Numba. Outputs are written
+    into the preallocated (num_trips, num_stops) arrays.
+    """
+    num_trips, num_stops = arrivals.shape
+    for t in range(num_trips):
+        passengers = 0
+        for i in range(num_stops):
+            boarding = arrivals[t, i]
+            excess = max(0, passengers + boarding - bus_capacity[t])
+            boarding -= excess
+            passengers += boarding
+
+            alighting = min(passengers, departs[t, i])
+            passengers -= alighting
+
+            boarded[t, i] = boarding
+            # For stop 1, force alighting passengers to 0
+            alighted[t, i] = 0 if i == 0 else alighting
+            stop_time[t, i] = STOP_TIME_PER_PASSENGER * (boarding + alighting)
+            overflow[t, i] = excess
+
+
+compiled_trip_kernel = njit(cache=True)(trip_kernel) if njit is not None else trip_kernel
+HAS_NUMBA = njit is not None
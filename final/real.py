@@ -1,12 +1,32 @@
 import numpy as np
 from scipy.stats import invgauss, burr, cauchy, norm, genpareto, logistic, genextreme, geom
 
+from sketch import TailMetrics
+
+# Fitted model parameters for the 10-minute base interval
+ARRIVAL_PROBS = [0.1477, 0.1947, 0.1583, 0.0969, 0.3929, 0.1930, 0.8800, 0.9167, 0.6111]
+DEPART_PROBS = [1.0000, 0.3333, 0.4490, 0.2178, 0.1176, 0.1692, 0.6286, 0.2444, 0.1947]
+TRAVEL_TIME_DISTRIBUTIONS = [  # Legs 1_to_2 ... 8_to_9, 9_to_1
+    invgauss(mu=25.47, scale=np.sqrt(178.75)/25.47, loc=33.711),
+    invgauss(mu=105.42, scale=np.sqrt(4993.3)/105.42),
+    burr(c=11.081, d=0.57773, loc=0, scale=123.18),
+    cauchy(loc=177.26, scale=12.508),
+    norm(loc=96.401, scale=16.862),
+    genpareto(c=-0.49566, loc=196.64, scale=39.068),
+    logistic(loc=48.301, scale=5.2597),
+    genextreme(c=-0.33525, loc=22.453, scale=5.7636),
+    genextreme(c=0.3512, loc=78.031, scale=5.9755)
+]
+BACK_TO_START_DISTRIBUTION = genextreme(c=0.3512, loc=78.031, scale=5.9755)
+STOP_TIME_PER_PASSENGER = 2.877
+
 class ShuttleBusSimulation:
     def __init__(self, num_stops=9, arrival_distributions=None, depart_distributions=None,
-                 stop_time_distributions=None, travel_time_distributions=None, bus_capacity=40):
+                 stop_time_distributions=None, travel_time_distributions=None, bus_capacity=40,
+                 keep_results=True):
         self.num_stops = num_stops
-        self.original_arrival_probs = [0.1477, 0.1947, 0.1583, 0.0969, 0.3929, 0.1930, 0.8800, 0.9167, 0.6111]
-        self.original_depart_probs = [1.0000, 0.3333, 0.4490, 0.2178, 0.1176, 0.1692, 0.6286, 0.2444, 0.1947]
+        self.original_arrival_probs = list(ARRIVAL_PROBS)
+        self.original_depart_probs = list(DEPART_PROBS)
         self.arrival_distributions = arrival_distributions or [
             (lambda p: lambda: geom.rvs(p=p))(p) for p in self.original_arrival_probs
         ]
@@ -16,20 +36,16 @@ class ShuttleBusSimulation:
 
         self.stop_time_distributions = stop_time_distributions or [lambda: 0 for _ in range(num_stops)]
         self.travel_time_distributions = travel_time_distributions or [
-            lambda: invgauss.rvs(mu=25.47, scale=np.sqrt(178.75)/25.47, loc=33.711),
-            lambda: invgauss.rvs(mu=105.42, scale=np.sqrt(4993.3)/105.42),
-            lambda: burr.rvs(c=11.081, d=0.57773, loc=0, scale=123.18),
-            lambda: cauchy.rvs(loc=177.26, scale=12.508),
-            lambda: norm.rvs(loc=96.401, scale=16.862),
-            lambda: genpareto.rvs(c=-0.49566, loc=196.64, scale=39.068),
-            lambda: logistic.rvs(loc=48.301, scale=5.2597),
-            lambda: genextreme.rvs(c=-0.33525, loc=22.453, scale=5.7636),
-            lambda: genextreme.rvs(c=0.3512, loc=78.031, scale=5.9755)
+            (lambda d: lambda: d.rvs())(d) for d in TRAVEL_TIME_DISTRIBUTIONS
         ]
-        self.back_to_start_distribution = lambda: genextreme.rvs(c=0.3512, loc=78.031, scale=5.9755)
+        self.back_to_start_distribution = lambda: BACK_TO_START_DISTRIBUTION.rvs()
         self.bus_capacity = bus_capacity
 
+        self.keep_results = keep_results  # False keeps only the streaming tail metrics, in constant memory
         self.results = []  # List to store results for each bus trip
+        self.checkpoints = []  # Per-trip state before each stop (seeded runs only), aligned with self.results
+        self.tail_metrics = TailMetrics(num_stops=num_stops)  # Updated as each trip finishes
+        self.tail_metrics_stale = False  # Set by resimulate_from_stop; rebuilt from self.results when next summarized
         self.passengers = 0
 
     def adjust_probabilities(self, original_probs, old_interval, new_interval):
@@ -73,7 +89,7 @@ class ShuttleBusSimulation:
         passengers_alighting = min(self.passengers, depart_distribution())
         self.passengers -= passengers_alighting
 
-        stop_time = 2.877 * (passengers_boarding + passengers_alighting)
+        stop_time = STOP_TIME_PER_PASSENGER * (passengers_boarding + passengers_alighting)
 
         # For stop 1, force alighting passengers to 0
         if stop_number == 1:
@@ -97,11 +113,24 @@ class ShuttleBusSimulation:
             return travel_time
         return 0
 
-    def run_trip(self, start_time):
-        trip_results = []
-        current_time = start_time
+    def seed_stop(self, trip_key, stop_number):
+        """
+        Seed the random stream for one stop of one trip (common random numbers).
+
+        Args:
+            trip_key (list): Identifies the trip, e.g. [seed, replica, departure_time]. None disables seeding.
+            stop_number (int): Stop whose draws are about to be made.
+        """
+        if trip_key is not None:
+            np.random.seed([*trip_key, stop_number])
+
+    def run_stops(self, trip_results, checkpoint, current_time, first_stop):
+        for stop in range(first_stop, self.num_stops + 1):
+            # Checkpoint the trip state before this stop so a later change here can resume from it
+            if checkpoint["trip_key"] is not None:
+                checkpoint["states"].append({"passengers": self.passengers, "time": current_time})
+            self.seed_stop(checkpoint["trip_key"], stop)
 
-        for stop in range(1, self.num_stops + 1):
             stop_result = self.simulate_stop(stop)
             travel_time = self.simulate_travel(stop)
 
@@ -116,6 +145,7 @@ class ShuttleBusSimulation:
             current_time += stop_result["stop_time"] + travel_time
 
         # Add travel time back to the first stop
+        self.seed_stop(checkpoint["trip_key"], self.num_stops + 1)
         travel_time_back = self.simulate_travel(self.num_stops)
         trip_results.append({
             "stop": "Back to Start",
@@ -127,17 +157,86 @@ class ShuttleBusSimulation:
             "overflow": 0
         })
 
-        self.results.append(trip_results)
+    def trip_time(self, trip_results):
+        """
+        Seconds from departure until the bus is back at stop 1. The last stop's travel time is
+        already the leg back to stop 1, so this is the "Back to Start" row's time.
+        """
+        return trip_results[-1]["time"] - trip_results[0]["time"]
+
+    def run_trip(self, start_time, trip_key=None):
+        trip_results = []
+        checkpoint = {"trip_key": trip_key, "states": []}
+        self.run_stops(trip_results, checkpoint, start_time, 1)
 
-    def run(self, start_time, end_time, headway_minutes, num_simulations=1):
-        for _ in range(num_simulations):
-            headway_seconds = headway_minutes * 60
-            current_time = start_time
+        if not self.tail_metrics_stale:  # A stale digest is rebuilt from self.results, which includes this trip
+            self.tail_metrics.add_trip(trip_results, self.trip_time(trip_results))
+        if self.keep_results:
+            self.results.append(trip_results)
+            self.checkpoints.append(checkpoint)
 
-            while current_time <= end_time:
-                self.passengers = 0  # Reset passengers for each trip
-                self.run_trip(current_time)
-                current_time += headway_seconds
+    def run(self, start_time, end_time, headway_minutes, num_simulations=1, seed=None):
+        """
+        Simulate every departure in a service window.
+
+        Args:
+            start_time (int): First departure in seconds.
+            end_time (int): Last possible departure in seconds.
+            headway_minutes (float): Minutes between departures.
+            num_simulations (int): Number of replicas per departure.
+            seed (int): If given, each (replica, departure, stop) draws from its own seeded stream so that
+                resimulate_from_stop reproduces unchanged stops exactly (common random numbers).
+        """
+        random_state = np.random.get_state()  # seed_stop reseeds the global stream; restored below
+        try:
+            for replica in range(num_simulations):
+                headway_seconds = headway_minutes * 60
+                current_time = start_time
+
+                while current_time <= end_time:
+                    self.passengers = 0  # Reset passengers for each trip
+                    trip_key = None if seed is None else [seed, replica, int(current_time)]
+                    self.run_trip(current_time, trip_key=trip_key)
+                    current_time += headway_seconds
+        finally:
+            # Later unseeded draws continue from where they were, not from the last per-stop seed
+            if seed is not None:
+                np.random.set_state(random_state)
+
+    def resimulate_from_stop(self, stop_number):
+        """
+        Re-run all stored trips from the given stop onwards, reusing the checkpointed prefix.
+
+        Call this after changing the parameters of a single stop. Arrival/departure changes at stop k
+        and the leg k_to_k+1 (drawn at stop k) both take effect from stop k; stops 1..k-1 are kept as is.
+        A change to the back-to-start distribution (stop_number = num_stops + 1) reruns the last stop,
+        whose travel time is drawn from it as well.
+
+        Args:
+            stop_number (int): First stop whose results may change, 1..num_stops + 1.
+        """
+        if not 1 <= stop_number <= self.num_stops + 1:
+            raise ValueError(f"stop_number must be between 1 and {self.num_stops + 1}, got {stop_number}")
+        if not self.keep_results:
+            raise ValueError("resimulate_from_stop needs the stored trips (keep_results=True)")
+        if any(checkpoint["trip_key"] is None for checkpoint in self.checkpoints):
+            raise ValueError("resimulate_from_stop needs trips run with a seed (run(..., seed=...))")
+        first_stop = min(stop_number, self.num_stops)
+
+        random_state = np.random.get_state()  # seed_stop reseeds the global stream; restored below
+        try:
+            for trip_results, checkpoint in zip(self.results, self.checkpoints):
+                state = checkpoint["states"][first_stop - 1]
+                del trip_results[first_stop - 1:]
+                del checkpoint["states"][first_stop - 1:]
+
+                self.passengers = state["passengers"]
+                self.run_stops(trip_results, checkpoint, state["time"], first_stop)
+        finally:
+            np.random.set_state(random_state)
+
+        # The digests cannot drop the old trips; rebuild them only when they are next summarized
+        self.tail_metrics_stale = True
 
     def summarize_results_by_departure_time(self):
         results_by_departure = {}
@@ -177,31 +276,53 @@ class ShuttleBusSimulation:
 
         return formatted_results
 
-# Example usage of the updated simulation
-simulation = ShuttleBusSimulation(num_stops=9, bus_capacity=40)
-
-# Adjust probabilities for a new interval
-old_interval = 10  # Original interval in minutes
-new_interval = 7   # New interval in minutes
-simulation.update_intervals(old_interval, new_interval)
+    def summarize_tail_metrics_by_departure_time(self, quantiles=(0.9, 0.95, 0.99)):
+        """
+        Tail quantiles of trip time, elapsed time and stop time, and overflow probabilities, per
+        departure time slot (see sketch.TailMetrics.summary for the format). The digests are updated
+        as each trip finishes, so this also works with keep_results=False.
+        """
+        if self.tail_metrics_stale:
+            self.tail_metrics = TailMetrics(num_stops=self.num_stops)
+            for trip_results in self.results:
+                self.tail_metrics.add_trip(trip_results, self.trip_time(trip_results))
+            self.tail_metrics_stale = False
+        return self.tail_metrics.summary(quantiles)
 
 # Define the schedule in seconds (11:30 -> 11:50 and 12:40 -> 13:40)
 def time_to_seconds(hour, minute):
     return hour * 3600 + minute * 60
 
-# Run the simulation
-start_time_1 = time_to_seconds(11, 30)
-end_time_1 = time_to_seconds(11, 50)
-start_time_2 = time_to_seconds(12, 40)
-end_time_2 = time_to_seconds(13, 40)
-simulation.run(start_time=start_time_1, end_time=end_time_1, headway_minutes=7, num_simulations=1000)
-simulation.run(start_time=start_time_2, end_time=end_time_2, headway_minutes=7, num_simulations=1000)
-
-# Summarize and print results
-results_by_time = simulation.summarize_results_by_departure_time()
-for time_label, stops_data in results_by_time.items():
-    print(f"\n===== {time_label} 시간대 결과 =====")
-    print("정류장 | 평균 탑승자 수 | 평균 하차자 수 | 평균 정차 시간 | 평균 이동 시간 | 평균 초과 인원")
-    for stop_data in stops_data:
-        print(f"{stop_data['stop']:>6} | {stop_data['avg_boarded']:>14.2f} | {stop_data['avg_alighted']:>14.2f} | "
-              f"{stop_data['avg_stop_time']:>14.2f} | {stop_data['avg_travel_time']:>14} | {stop_data['avg_overflow']:>14.2f}")
\ No newline at end of file
+if __name__ == "__main__":
+    # Example usage of the updated simulation
+    simulation = ShuttleBusSimulation(num_stops=9, bus_capacity=40)
+
+    # Adjust probabilities for a new interval
+    old_interval = 10  # Original interval in minutes
+    new_interval = 7   # New interval in minutes
+    simulation.update_intervals(old_interval, new_interval)
+
+    # Run the simulation
+    start_time_1 = time_to_seconds(11, 30)
+    end_time_1 = time_to_seconds(11, 50)
+    start_time_2 = time_to_seconds(12, 40)
+    end_time_2 = time_to_seconds(13, 40)
+    simulation.run(start_time=start_time_1, end_time=end_time_1, headway_minutes=7, num_simulations=1000)
+    simulation.run(start_time=start_time_2, end_time=end_time_2, headway_minutes=7, num_simulations=1000)
+
+    # Summarize and print results
+    results_by_time = simulation.summarize_results_by_departure_time()
+    for time_label, stops_data in results_by_time.items():
+        print(f"\n===== {time_label} 시간대 결과 =====")
+        print("정류장 | 평균 탑승자 수 | 평균 하차자 수 | 평균 정차 시간 | 평균 이동 시간 | 평균 초과 인원")
+        for stop_data in stops_data:
+            print(f"{stop_data['stop']:>6} | {stop_data['avg_boarded']:>14.2f} | {stop_data['avg_alighted']:>14.2f} | "
+                  f"{stop_data['avg_stop_time']:>14.2f} | {stop_data['avg_travel_time']:>14} | {stop_data['avg_overflow']:>14.2f}")
+
+    # Tail metrics for service guarantees
+    tail_by_time = simulation.summarize_tail_metrics_by_departure_time()
+    for time_label, tail_data in tail_by_time.items():
+        trip_time = tail_data["trip_time"]
+        print(f"\n===== {time_label} 시간대 꼬리 지표 =====")
+        print(f"운행 시간 p90/p95/p99: {trip_time[0.9]:.1f} / {trip_time[0.95]:.1f} / {trip_time[0.99]:.1f}, "
+              f"초과 인원 발생 확률: {tail_data['overflow_prob']:.3f}")
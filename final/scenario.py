@@ -0,0 +1,188 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from real import ARRIVAL_PROBS, DEPART_PROBS
+from batch import draw_trip_inputs, passenger_counts, simulate_trips
+from sketch import TailMetrics
+
+NUM_STOPS = 9
+
+
+def label_to_seconds(label):
+    hours, minutes = map(int, label.split(":"))
+    return hours * 3600 + minutes * 60
+
+
+def seconds_to_label(seconds):
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return f"{hours:02}:{minutes:02}"
+
+
+def load_scenario(file_path):
+    """
+    Read a scenario file (JSON).
+
+    {
+        "name": "express",
+        "bus_capacity": 40,              # default for every pattern
+        "base_interval": 10,             # interval (minutes) the fitted probabilities refer to
+        "num_replicas": 1000,
+        "seed": 0,
+        "patterns": {                    # stop patterns; must start at stop 1
+            "regular": {"stops": [1, 2, 3, 4, 5, 6, 7, 8, 9]},
+            "express": {"stops": [1, 3, 5, 7, 9], "bus_capacity": 40}
+        },
+        "schedule": [                    # service windows and explicit departure lists
+            {"pattern": "regular", "start": "11:30", "end": "11:50", "headway": 10},
+            {"pattern": "express", "times": ["11:35", "11:45"], "interval": 5}
+        ]
+    }
+
+    "interval" is the passenger accumulation time (minutes) used to adjust the stop probabilities;
+    it defaults to the headway of a window and to base_interval for a list of times.
+    """
+    with open(file_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_schedule(scenario):
+    """
+    Compile the whole day's schedule into per-departure arrays.
+
+    Returns:
+        dict: "departure" (num_departures,) seconds, "pattern" names, "served" (num_departures, num_stops)
+            mask, "arrival_probs" and "depart_probs" (num_departures, num_stops), "bus_capacity" (num_departures,).
+    """
+    base_interval = scenario.get("base_interval", 10)
+    patterns = scenario["patterns"]
+    departure, pattern, interval = [], [], []
+
+    for entry in scenario["schedule"]:
+        if entry["pattern"] not in patterns:
+            raise ValueError(f"Unknown pattern {entry['pattern']!r} in schedule, expected one of {list(patterns)}")
+        if "times" in entry:
+            times = [label_to_seconds(label) for label in entry["times"]]
+            entry_interval = entry.get("interval", base_interval)
+        else:
+            times = range(label_to_seconds(entry["start"]), label_to_seconds(entry["end"]) + 1,
+                          int(entry["headway"] * 60))
+            entry_interval = entry.get("interval", entry["headway"])
+        departure.extend(times)
+        pattern.extend([entry["pattern"]] * len(times))
+        interval.extend([entry_interval] * len(times))
+
+    for name, spec in patterns.items():
+        if spec["stops"][0] != 1:
+            raise ValueError(f"Pattern {name!r} must start at stop 1")
+        invalid = [stop for stop in spec["stops"] if not 1 <= stop <= NUM_STOPS]
+        if invalid:
+            raise ValueError(f"Pattern {name!r} has stops outside 1..{NUM_STOPS}: {invalid}")
+
+    served = np.array([np.isin(np.arange(1, NUM_STOPS + 1), patterns[name]["stops"]) for name in pattern])
+    # Same adjustment as ShuttleBusSimulation.adjust_probabilities, for every departure at once
+    ratio = base_interval / np.array(interval, dtype=float)[:, None]
+    return {
+        "departure": np.array(departure),
+        "pattern": np.array(pattern),
+        "served": served,
+        "arrival_probs": 1 - (1 - np.array(ARRIVAL_PROBS)) ** ratio,
+        "depart_probs": 1 - (1 - np.array(DEPART_PROBS)) ** ratio,
+        "bus_capacity": np.array([patterns[name].get("bus_capacity", scenario.get("bus_capacity", 40))
+                                  for name in pattern]),
+    }
+
+
+def run_scenario(scenario, num_replicas=None, seed=None, backend="auto", quantiles=(0.9, 0.95, 0.99)):
+    """
+    Simulate every departure × replica of a scenario in one vectorized pass.
+
+    Each served stop's travel time covers all legs up to the next served stop (or back to stop 1
+    for the last one), as in final/express.py; trip time is the time until the bus is back at stop 1.
+
+    Returns:
+        pd.DataFrame: One row per departure and served stop plus a "Back to Start" row per departure
+            holding the trip time.
+    """
+    num_replicas = num_replicas or scenario.get("num_replicas", 1000)
+    seed = scenario.get("seed") if seed is None else seed
+    schedule = compile_schedule(scenario)
+    num_departures = len(schedule["departure"])
+
+    def per_trip(values):
+        return np.repeat(values, num_replicas, axis=0)
+
+    served = per_trip(schedule["served"])
+    draws = draw_trip_inputs(num_departures * num_replicas, num_stops=NUM_STOPS, random_state=seed)
+    trips = simulate_trips(
+        np.where(served, passenger_counts(draws["arrival_u"], per_trip(schedule["arrival_probs"])), 0),
+        np.where(served, passenger_counts(draws["depart_u"], per_trip(schedule["depart_probs"])), 0),
+        draws["travel"],
+        bus_capacity=per_trip(schedule["bus_capacity"]),
+        backend=backend,
+    )
+
+    # Attribute every leg to the last served stop at or before it
+    owner = np.maximum.accumulate(np.where(served, np.arange(NUM_STOPS), 0), axis=1)
+    travel_time = np.zeros_like(draws["travel"])
+    rows = np.arange(len(owner))
+    for i in range(NUM_STOPS):
+        travel_time[rows, owner[:, i]] += draws["travel"][:, i]
+
+    time_at_stop = np.cumsum(trips["stop_time"] + travel_time, axis=1)
+    elapsed = np.column_stack([np.zeros(len(time_at_stop)), time_at_stop[:, :-1]])
+    trip_time = time_at_stop[:, -1]
+
+    tail_metrics = TailMetrics(num_stops=NUM_STOPS)
+    for d in range(num_departures):
+        rows = slice(d * num_replicas, (d + 1) * num_replicas)
+        tail_metrics.add_trips(d, trip_time[rows], np.where(served[rows], elapsed[rows], np.nan),
+                               np.where(served[rows], trips["stop_time"][rows], np.nan), trips["overflow"][rows])
+    tails = tail_metrics.summary(quantiles)
+
+    def per_departure(values):
+        return values.reshape(num_departures, num_replicas, -1).mean(axis=1)
+
+    means = {key: per_departure(values) for key, values in [
+        ("boarded", trips["boarded"]), ("alighted", trips["alighted"]), ("stop_time", trips["stop_time"]),
+        ("travel_time", travel_time), ("elapsed", elapsed), ("overflow", trips["overflow"]),
+    ]}
+
+    table = []
+    for d in range(num_departures):
+        row = {"departure": seconds_to_label(schedule["departure"][d]), "pattern": schedule["pattern"][d]}
+        for i in np.flatnonzero(schedule["served"][d]):
+            stop_tails = tails[d]["stops"][i]
+            table.append({
+                **row,
+                "stop": i + 1,
+                **{f"avg_{key}": values[d, i] for key, values in means.items()},
+                **{f"elapsed_p{round(q * 100)}": value for q, value in stop_tails["elapsed"].items()},
+                "overflow_prob": stop_tails["overflow_prob"],
+            })
+        table.append({
+            **row,
+            "stop": "Back to Start",
+            "avg_elapsed": trip_time[d * num_replicas:(d + 1) * num_replicas].mean(),
+            **{f"elapsed_p{round(q * 100)}": value for q, value in tails[d]["trip_time"].items()},
+            "overflow_prob": tails[d]["overflow_prob"],
+        })
+
+    return pd.DataFrame(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a whole-day shuttle scenario in one batch.")
+    parser.add_argument("scenario", help="Scenario file (JSON)")
+    parser.add_argument("output", help="Results table (CSV)")
+    parser.add_argument("--replicas", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--backend", default="auto")
+    args = parser.parse_args()
+
+    results = run_scenario(load_scenario(args.scenario), num_replicas=args.replicas, seed=args.seed,
+                           backend=args.backend)
+    results.to_csv(args.output, index=False)
+    print(f"{results['departure'].nunique()}개 출발편 결과 저장: {args.output}")
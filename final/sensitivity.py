@@ -0,0 +1,239 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import qmc
+
+from real import ARRIVAL_PROBS, DEPART_PROBS
+from batch import draw_trip_inputs, passenger_counts, simulate_trips, trip_times
+
+NUM_STOPS = 9
+LEG_NAMES = [f"{i}_to_{i + 1}" for i in range(1, NUM_STOPS)] + [f"{NUM_STOPS}_to_1"]
+FACTOR_NAMES = ([f"{i}_arrival_prob" for i in range(1, NUM_STOPS + 1)]
+                + [f"{i}_depart_prob" for i in range(1, NUM_STOPS + 1)]
+                + [f"{leg}_scale" for leg in LEG_NAMES])
+OUTPUT_NAMES = ["trip_time", "overflow_prob", "overflow"]
+FITTED_FACTORS = ARRIVAL_PROBS + DEPART_PROBS + [1.0] * NUM_STOPS  # The fitted model, ordered as FACTOR_NAMES
+
+_worker_inputs = {}  # Pre-drawn random inputs, shared by every design point evaluated in a process
+
+
+def default_bounds(prob_spread=0.2, scale_spread=0.2):
+    """
+    Ranges for the sensitivity factors: stop probabilities ±prob_spread around the fitted values
+    and a multiplicative scale of 1 ± scale_spread on every leg's travel time.
+
+    Returns:
+        np.ndarray: (num_factors, 2) array of [low, high], ordered as FACTOR_NAMES.
+    """
+    probs = np.array(ARRIVAL_PROBS + DEPART_PROBS)
+    prob_bounds = np.column_stack([probs * (1 - prob_spread), np.minimum(probs * (1 + prob_spread), 1.0)])
+    scale_bounds = np.tile([1 - scale_spread, 1 + scale_spread], (NUM_STOPS, 1))
+    return np.vstack([prob_bounds, scale_bounds])
+
+
+def init_worker(num_replicas, seed):
+    # Every process draws the same inputs, so all design points share common random numbers
+    _worker_inputs.update(draw_trip_inputs(num_replicas, num_stops=NUM_STOPS, random_state=seed))
+
+
+def evaluate_points(points, bus_capacity=40, backend="auto"):
+    """
+    Evaluate design points against the pre-drawn inputs of this process.
+
+    All points × replicas are stacked into one batch for simulate_trips.
+
+    Args:
+        points (np.ndarray): (num_points, num_factors) design points, ordered as FACTOR_NAMES.
+        bus_capacity (int): Bus capacity.
+        backend (str): Trip kernel backend, see batch.BACKENDS.
+
+    Returns:
+        np.ndarray: (num_points, len(OUTPUT_NAMES)) mean trip time, probability of any overflow
+            and mean overflow per trip.
+    """
+    num_points = len(points)
+    arrival_probs = points[:, None, :NUM_STOPS]
+    depart_probs = points[:, None, NUM_STOPS:2 * NUM_STOPS]
+    scales = points[:, None, 2 * NUM_STOPS:]
+
+    trips = simulate_trips(
+        passenger_counts(_worker_inputs["arrival_u"][None], arrival_probs).reshape(-1, NUM_STOPS),
+        passenger_counts(_worker_inputs["depart_u"][None], depart_probs).reshape(-1, NUM_STOPS),
+        (_worker_inputs["travel"][None] * scales).reshape(-1, NUM_STOPS),
+        bus_capacity=bus_capacity,
+        backend=backend,
+    )
+    overflow = trips["overflow"].sum(axis=1).reshape(num_points, -1)
+
+    return np.column_stack([
+        trip_times(trips).reshape(num_points, -1).mean(axis=1),
+        (overflow > 0).mean(axis=1),
+        overflow.mean(axis=1),
+    ])
+
+
+def evaluate_parallel(points, num_replicas=200, seed=0, bus_capacity=40, max_workers=None, chunk_size=64,
+                      backend="auto"):
+    """
+    Evaluate design points in chunks across worker processes.
+
+    Args:
+        points (np.ndarray): (num_points, num_factors) design points.
+        num_replicas (int): Trips simulated per design point.
+        seed (int): Seed of the common random inputs.
+        bus_capacity (int): Bus capacity.
+        max_workers (int): Number of processes; 1 evaluates in this process.
+        chunk_size (int): Design points per task.
+        backend (str): Trip kernel backend, see batch.BACKENDS.
+
+    Returns:
+        np.ndarray: (num_points, len(OUTPUT_NAMES)) outputs.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = [points[i:i + chunk_size] for i in range(0, len(points), chunk_size)]
+
+    if max_workers == 1:
+        init_worker(num_replicas, seed)
+        return np.vstack([evaluate_points(chunk, bus_capacity, backend) for chunk in chunks])
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(num_replicas, seed)) as executor:
+        results = executor.map(evaluate_points, chunks, [bus_capacity] * len(chunks), [backend] * len(chunks))
+        return np.vstack(list(results))
+
+
+def saltelli_matrices(num_samples, bounds, seed=0):
+    """
+    Build the Saltelli design: A, B and the AB_i matrices (A with column i taken from B).
+
+    Returns:
+        tuple: (A, B, AB) with A, B of shape (num_samples, num_factors) and AB of shape
+            (num_factors, num_samples, num_factors).
+    """
+    num_factors = len(bounds)
+    base = qmc.Sobol(d=2 * num_factors, scramble=True, seed=seed).random(num_samples)
+    base = qmc.scale(base, np.tile(bounds[:, 0], 2), np.tile(bounds[:, 1], 2))
+    A, B = base[:, :num_factors], base[:, num_factors:]
+
+    AB = np.repeat(A[None], num_factors, axis=0)
+    for i in range(num_factors):
+        AB[i, :, i] = B[:, i]
+    return A, B, AB
+
+
+def sobol_estimates(y_A, y_B, y_AB):
+    """
+    First-order (Saltelli 2010) and total (Jansen) indices.
+
+    Args:
+        y_A, y_B (np.ndarray): (..., num_samples, num_outputs) outputs at A and B.
+        y_AB (np.ndarray): (..., num_factors, num_samples, num_outputs) outputs at AB_i.
+
+    Returns:
+        tuple: (first_order, total), each (..., num_factors, num_outputs).
+    """
+    y_all = np.concatenate([y_A, y_B], axis=-2)
+    mean, variance = y_all.mean(axis=-2)[..., None, :], y_all.var(axis=-2)[..., None, :]
+    # Centering keeps the first-order estimator stable when the output mean is large (trip time)
+    y_A, y_B, y_AB = y_A - mean, y_B - mean, y_AB - mean[..., None, :, :]
+    y_A, y_B = y_A[..., None, :, :], y_B[..., None, :, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first_order = (y_B * (y_AB - y_A)).mean(axis=-2) / variance
+        total = 0.5 * ((y_A - y_AB) ** 2).mean(axis=-2) / variance
+    return first_order, total
+
+
+def sobol_indices(y_A, y_B, y_AB, num_resamples=1000, confidence=0.95, seed=0):
+    """
+    Sobol indices with percentile bootstrap confidence intervals over the sample rows.
+
+    Returns:
+        dict: "S1", "ST" of shape (num_factors, num_outputs) and "S1_conf", "ST_conf" of shape
+            (2, num_factors, num_outputs) holding the lower and upper bounds.
+    """
+    first_order, total = sobol_estimates(y_A, y_B, y_AB)
+
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(y_A), size=(num_resamples, len(y_A)))
+    boot = [sobol_estimates(y_A[chunk], y_B[chunk], y_AB[:, chunk].transpose(1, 0, 2, 3))
+            for chunk in np.array_split(idx, max(1, num_resamples // 100))]  # Bounded memory per chunk
+    boot_first = np.concatenate([first for first, _ in boot])
+    boot_total = np.concatenate([total for _, total in boot])
+
+    tails = [(1 - confidence) / 2, (1 + confidence) / 2]
+    return {
+        "S1": first_order,
+        "ST": total,
+        "S1_conf": np.nanquantile(boot_first, tails, axis=0),
+        "ST_conf": np.nanquantile(boot_total, tails, axis=0),
+    }
+
+
+def run_sobol(budget, bounds=None, num_replicas=200, seed=0, num_resamples=1000, confidence=0.95,
+              bus_capacity=40, max_workers=None, backend="auto"):
+    """
+    Sobol analysis of every output within a fixed number of design-point evaluations.
+
+    The sample size is the largest power of two with num_samples × (num_factors + 2) <= budget;
+    one set of sample matrices is evaluated once and reused for every output.
+
+    Returns:
+        dict: Output of sobol_indices plus "num_samples" and "num_evaluations".
+    """
+    bounds = default_bounds() if bounds is None else np.asarray(bounds)
+    num_factors = len(bounds)
+    if budget < num_factors + 2:
+        raise ValueError(f"budget must allow at least {num_factors + 2} evaluations")
+    num_samples = 2 ** int(np.log2(budget // (num_factors + 2)))
+
+    A, B, AB = saltelli_matrices(num_samples, bounds, seed=seed)
+    points = np.vstack([A, B, AB.reshape(-1, num_factors)])
+    y = evaluate_parallel(points, num_replicas=num_replicas, seed=seed, bus_capacity=bus_capacity,
+                          max_workers=max_workers, backend=backend)
+
+    y_A, y_B = y[:num_samples], y[num_samples:2 * num_samples]
+    y_AB = y[2 * num_samples:].reshape(num_factors, num_samples, -1)
+    indices = sobol_indices(y_A, y_B, y_AB, num_resamples=num_resamples, confidence=confidence, seed=seed)
+    indices["num_samples"] = num_samples
+    indices["num_evaluations"] = len(points)
+    return indices
+
+
+def run_one_at_a_time(bounds=None, baseline=None, num_replicas=200, seed=0, bus_capacity=40, max_workers=None,
+                      backend="auto"):
+    """
+    One-at-a-time design: move each factor to its low and high bound with the others at baseline.
+    The baseline defaults to the fitted model (FITTED_FACTORS).
+
+    Returns:
+        dict: "baseline" (num_outputs,), "low" and "high" (num_factors, num_outputs) outputs and
+            "effect" = high - low.
+    """
+    bounds = default_bounds() if bounds is None else np.asarray(bounds)
+    baseline = np.array(FITTED_FACTORS if baseline is None else baseline, dtype=float)
+    num_factors = len(bounds)
+
+    low = np.repeat(baseline[None], num_factors, axis=0)
+    high = low.copy()
+    low[np.arange(num_factors), np.arange(num_factors)] = bounds[:, 0]
+    high[np.arange(num_factors), np.arange(num_factors)] = bounds[:, 1]
+
+    y = evaluate_parallel(np.vstack([baseline[None], low, high]), num_replicas=num_replicas, seed=seed,
+                          bus_capacity=bus_capacity, max_workers=max_workers, backend=backend)
+    y_low, y_high = y[1:num_factors + 1], y[num_factors + 1:]
+    return {"baseline": y[0], "low": y_low, "high": y_high, "effect": y_high - y_low}
+
+
+if __name__ == "__main__":
+    # Example: which inputs drive trip time and overflow?
+    indices = run_sobol(budget=8000, num_replicas=200, seed=42)
+
+    for k, output in enumerate(OUTPUT_NAMES):
+        print(f"\n===== {output} 민감도 (N={indices['num_samples']}, 평가 {indices['num_evaluations']}회) =====")
+        print("입력 변수          |     S1 | S1 95% CI         |     ST | ST 95% CI")
+        for i in np.argsort(-indices["ST"][:, k]):
+            s1_low, s1_high = indices["S1_conf"][:, i, k]
+            st_low, st_high = indices["ST_conf"][:, i, k]
+            print(f"{FACTOR_NAMES[i]:<18} | {indices['S1'][i, k]:>6.3f} | [{s1_low:>6.3f}, {s1_high:>6.3f}] | "
+                  f"{indices['ST'][i, k]:>6.3f} | [{st_low:>6.3f}, {st_high:>6.3f}]")
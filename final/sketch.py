@@ -0,0 +1,203 @@
+import numpy as np
+
+
+class TDigest:
+    def __init__(self, compression=200, buffer_size=None):
+        """
+        Mergeable streaming quantile sketch (merging t-digest).
+
+        Memory stays around compression / 2 centroids however many values are added; the tails are
+        kept at the finest resolution, which is what p99 and overflow estimates need.
+
+        Args:
+            compression (float): Size parameter δ; more centroids give more accurate quantiles.
+            buffer_size (int): Values buffered before they are folded into the centroids.
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size or 10 * compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.buffered = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]  # nan marks "not observed", e.g. a stop the trip skipped
+        if len(values) == 0:
+            return
+        self.buffer.append(values)
+        self.buffered += len(values)
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        if self.buffered >= self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        """
+        Fold another digest into this one (e.g. the partial result of another worker).
+        """
+        other.compress()
+        self.compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.compress_centroids(np.concatenate([self.means, other.means]),
+                                np.concatenate([self.weights, other.weights]))
+        return self
+
+    def compress(self):
+        if not self.buffer:
+            return
+        values = np.concatenate(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.compress_centroids(np.concatenate([self.means, values]),
+                                np.concatenate([self.weights, np.ones(len(values))]))
+
+    def compress_centroids(self, means, weights):
+        if len(means) == 0:
+            return
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Group centroids by the integer part of the k1 scale at their centre, so no group spans
+        # more than about one unit of k; groups are small near q = 0 and q = 1.
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        starts = np.flatnonzero(np.diff(np.floor(k), prepend=-np.inf))
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """
+        Estimate quantile(s) q in [0, 1]; nan while the digest is empty.
+        """
+        self.compress()
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan)
+        centres = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0], centres, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q) * self.count, positions, values)
+
+    def cdf(self, x):
+        """
+        Estimate P(X <= x); nan while the digest is empty.
+        """
+        self.compress()
+        if self.count == 0:
+            return np.full(np.shape(x), np.nan)
+        centres = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0], centres, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(x, values, positions) / self.count
+
+
+class TailMetrics:
+    def __init__(self, num_stops=9, compression=200):
+        """
+        Streaming tail metrics per departure time slot, in constant memory per slot.
+
+        For every slot it keeps a t-digest of trip time and, per stop, of the elapsed time since
+        departure and the stop time, plus counts of trips with overflow. Instances from different
+        workers can be combined with merge.
+        """
+        self.num_stops = num_stops
+        self.compression = compression
+        self.slots = {}
+
+    def slot(self, time_label):
+        if time_label not in self.slots:
+            self.slots[time_label] = {
+                "trips": 0,
+                "overflow_trips": 0,
+                "trip_time": TDigest(self.compression),
+                "stops": [{"overflow_trips": 0,
+                           "elapsed": TDigest(self.compression),
+                           "stop_time": TDigest(self.compression)} for _ in range(self.num_stops)],
+            }
+        return self.slots[time_label]
+
+    def add_trips(self, time_label, trip_time, elapsed, stop_time, overflow):
+        """
+        Add a batch of trips that departed in one time slot.
+
+        Args:
+            time_label (str): Departure slot, e.g. "11:30".
+            trip_time (np.ndarray): Trip time per trip, (num_trips,).
+            elapsed (np.ndarray): Seconds from departure to arrival at each stop, (num_trips, num_stops).
+            stop_time (np.ndarray): Stop time at each stop, (num_trips, num_stops).
+            overflow (np.ndarray): Passengers left behind at each stop, (num_trips, num_stops).
+        """
+        slot = self.slot(time_label)
+        overflow = np.asarray(overflow)
+        slot["trips"] += len(trip_time)
+        slot["overflow_trips"] += int((overflow.sum(axis=1) > 0).sum())
+        slot["trip_time"].update(trip_time)
+        for i, stop in enumerate(slot["stops"]):
+            stop["overflow_trips"] += int((overflow[:, i] > 0).sum())
+            stop["elapsed"].update(elapsed[:, i])
+            stop["stop_time"].update(stop_time[:, i])
+
+    def add_trip(self, trip_results, trip_time):
+        """
+        Add one finished trip in the format of ShuttleBusSimulation.results, under its departure time
+        slot as in summarize_results_by_departure_time. Stops the trip does not serve are left out.
+
+        Args:
+            trip_results (list): Per-stop rows of the trip, ending with "Back to Start".
+            trip_time (float): Seconds from departure until the bus is back at stop 1; the engines
+                record the return leg differently, so each passes its own (see ShuttleBusSimulation.trip_time).
+        """
+        departure_time = trip_results[0]["time"]
+        hours, minutes = divmod(departure_time // 60, 60)
+        time_label = f"{hours:02}:{minutes:02}"
+
+        elapsed = np.full((1, self.num_stops), np.nan)
+        stop_time = np.full((1, self.num_stops), np.nan)
+        overflow = np.zeros((1, self.num_stops))
+        for result in trip_results[:-1]:  # The last row is "Back to Start"
+            i = result["stop"] - 1
+            elapsed[0, i] = result["time"] - departure_time
+            stop_time[0, i] = result["stop_time"]
+            overflow[0, i] = result["overflow"]
+        self.add_trips(time_label, [trip_time], elapsed, stop_time, overflow)
+
+    def merge(self, other):
+        for time_label, other_slot in other.slots.items():
+            slot = self.slot(time_label)
+            slot["trips"] += other_slot["trips"]
+            slot["overflow_trips"] += other_slot["overflow_trips"]
+            slot["trip_time"].merge(other_slot["trip_time"])
+            for stop, other_stop in zip(slot["stops"], other_slot["stops"]):
+                stop["overflow_trips"] += other_stop["overflow_trips"]
+                stop["elapsed"].merge(other_stop["elapsed"])
+                stop["stop_time"].merge(other_stop["stop_time"])
+        return self
+
+    def summary(self, quantiles=(0.9, 0.95, 0.99)):
+        """
+        Returns:
+            dict: time_label -> {"trip_time": {q: value}, "overflow_prob": float,
+                "stops": [{"stop", "elapsed": {q: value}, "stop_time": {q: value}, "overflow_prob"}]}
+        """
+        formatted_results = {}
+        for time_label, slot in self.slots.items():
+            trips = slot["trips"] if slot["trips"] > 0 else 1
+            formatted_results[time_label] = {
+                "trip_time": dict(zip(quantiles, slot["trip_time"].quantile(quantiles))),
+                "overflow_prob": slot["overflow_trips"] / trips,
+                "stops": [{
+                    "stop": i + 1,
+                    "elapsed": dict(zip(quantiles, stop["elapsed"].quantile(quantiles))),
+                    "stop_time": dict(zip(quantiles, stop["stop_time"].quantile(quantiles))),
+                    "overflow_prob": stop["overflow_trips"] / trips,
+                } for i, stop in enumerate(slot["stops"])],
+            }
+        return formatted_results
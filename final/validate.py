@@ -0,0 +1,294 @@
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.stats import anderson_ksamp, ks_2samp, kstwo, ttest_ind
+
+from real import ShuttleBusSimulation
+from batch import check_backends, run_batch
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)  # shuttle_simulation_v2 and extract_data live at the repository root
+
+from shuttle_simulation_v2 import ShuttleBusSimulationByTime  # noqa: E402
+from extract_data import extract_travel_and_stop_times  # noqa: E402
+
+NUM_STOPS = 9
+DATA_PATH = os.path.join(ROOT_DIR, "shuttlebus_data.csv")
+LEG_NAMES = [f"{i}_to_{i + 1}" for i in range(1, NUM_STOPS)] + [f"{NUM_STOPS}_to_1"]
+TESTS = ["ks", "ad", "mean", "spread"]
+MIN_SAMPLES = 5  # Groups with fewer observed trips are reported as skipped
+EXACT_KS_SAMPLES = 100  # Below this sample size the KS p-value is exact instead of asymptotic
+
+
+def named_columns(boarded, alighted, stop_time, travel_time):
+    """
+    Flatten per-stop arrays into named columns (boarded_1, ..., leg_9_to_1) so that engines with
+    different outputs can be compared on the columns they share.
+    """
+    columns = {}
+    for name, values in [("boarded", boarded), ("alighted", alighted), ("stop_time", stop_time)]:
+        for i in range(values.shape[1]):
+            columns[f"{name}_{i + 1}"] = values[:, i]
+    for i in range(travel_time.shape[1]):
+        columns[f"leg_{LEG_NAMES[i]}"] = travel_time[:, i]
+    return columns
+
+
+def observed_samples(file_path=DATA_PATH):
+    """
+    Observed trips per bus_time from shuttlebus_data.csv.
+
+    Returns:
+        dict: bus_time -> named columns (see named_columns).
+    """
+    data = pd.read_csv(file_path).dropna(subset=["bus_time"])
+    samples = {}
+    for bus_time, group in data.groupby("bus_time"):
+        samples[bus_time] = named_columns(
+            group[[f"{i}_arrival_count" for i in range(1, NUM_STOPS + 1)]].to_numpy(dtype=float),
+            group[[f"{i}_depart_count" for i in range(1, NUM_STOPS + 1)]].to_numpy(dtype=float),
+            group[[f"{i}_stop_time" for i in range(1, NUM_STOPS + 1)]].to_numpy(dtype=float),
+            group[LEG_NAMES].to_numpy(dtype=float),
+        )
+    return samples
+
+
+def by_time_samples(num_trips, file_path=DATA_PATH, seed=0, bus_capacity=40):
+    """
+    ShuttleBusSimulationByTime (shuttle_simulation_v2) in batch mode, fitted per bus_time.
+    """
+    simulation = ShuttleBusSimulationByTime(*extract_travel_and_stop_times(file_path),
+                                            num_simulations=num_trips, bus_capacity=bus_capacity)
+    samples = {}
+    for time_slot in simulation.travel_times:
+        results = simulation.run_batch(time_slot, random_state=seed)
+        samples[time_slot] = named_columns(results["boardings"], results["alightings"],
+                                           results["stop_times"], results["travel_times"])
+    return samples
+
+
+def batch_samples(num_trips, seed=0, backend="numpy", bus_capacity=40):
+    """
+    final/real.py model through the batched engine (batch.run_batch).
+    """
+    trips = run_batch(num_trips, bus_capacity=bus_capacity, random_state=seed, backend=backend)
+    return named_columns(trips["boarded"], trips["alighted"], trips["stop_time"], trips["travel_time"])
+
+
+def reference_samples(num_trips, seed=0, bus_capacity=40):
+    """
+    final/real.py model through the reference engine (ShuttleBusSimulation.run_trip).
+    """
+    simulation = ShuttleBusSimulation(num_stops=NUM_STOPS, bus_capacity=bus_capacity)
+    simulation.run(start_time=0, end_time=0, headway_minutes=10, num_simulations=num_trips, seed=seed)
+    values = {key: np.array([[result[key] for result in trip[:-1]] for trip in simulation.results], dtype=float)
+              for key in ["boarded", "alighted", "stop_time", "travel_time"]}
+    return named_columns(values["boarded"], values["alighted"], values["stop_time"], values["travel_time"])
+
+
+def ks_columns(x, y):
+    """
+    Two-sample Kolmogorov–Smirnov test for every column at once. The p-value is asymptotic, or exact
+    when either sample has fewer than EXACT_KS_SAMPLES trips (the asymptotic one gives p = 0 for
+    D = 1 with two or three observed trips).
+
+    Args:
+        x (np.ndarray): (n, num_columns) first sample.
+        y (np.ndarray): (m, num_columns) second sample.
+
+    Returns:
+        tuple: (statistic, p_value), each (num_columns,).
+    """
+    n, m = len(x), len(y)
+    pooled = np.vstack([x, y])
+    order = np.argsort(pooled, axis=0, kind="stable")
+    values = np.take_along_axis(pooled, order, axis=0)
+    steps = np.where(order < n, 1 / n, -1 / m)
+    # ECDF difference, evaluated only at the last of tied values
+    diff = np.cumsum(steps, axis=0)
+    last_of_ties = np.vstack([values[1:] != values[:-1], np.ones((1, pooled.shape[1]), dtype=bool)])
+    statistic = np.where(last_of_ties, np.abs(diff), 0).max(axis=0)
+    if min(n, m) < EXACT_KS_SAMPLES:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            p_value = np.array([ks_2samp(x[:, i], y[:, i], method="exact").pvalue for i in range(x.shape[1])])
+        return statistic, p_value
+    # Same asymptotic treatment as scipy.stats.ks_2samp(method="asymp")
+    return statistic, kstwo.sf(statistic, np.round(n * m / (n + m)))
+
+
+def ad_columns(x, y):
+    """
+    k-sample Anderson–Darling test per column (p-values are clipped by scipy to [0.001, 0.25]).
+    """
+    statistic, p_value = np.full(x.shape[1], np.nan), np.full(x.shape[1], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for i in range(x.shape[1]):
+            if np.ptp(np.concatenate([x[:, i], y[:, i]])) > 0:
+                result = anderson_ksamp([x[:, i], y[:, i]])
+                statistic[i], p_value[i] = result.statistic, result.pvalue
+    return statistic, p_value
+
+
+def moment_columns(x, y, min_samples=MIN_SAMPLES):
+    """
+    Welch tests for equal means and for equal spread (Brown–Forsythe: absolute deviations from the median).
+    Both are skipped (nan) when either sample has fewer than min_samples trips, since variance
+    estimates from two or three trips make them meaningless.
+    """
+    if min(len(x), len(y)) < min_samples:
+        skipped = np.full(x.shape[1], np.nan)
+        return (skipped, skipped), (skipped, skipped)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        mean = ttest_ind(x, y, axis=0, equal_var=False)
+        spread = ttest_ind(np.abs(x - np.median(x, axis=0)), np.abs(y - np.median(y, axis=0)),
+                           axis=0, equal_var=False)
+    return (mean.statistic, mean.pvalue), (spread.statistic, spread.pvalue)
+
+
+def adjust_p_values(p_values, method="holm"):
+    """
+    Multiple-testing correction: "holm" (family-wise error) or "bh" (Benjamini–Hochberg, false
+    discovery rate). nan p-values (tests that could not be run) are left out.
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full(len(p_values), np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    order = valid[np.argsort(p_values[valid])]
+    num_tests = len(order)
+
+    if method == "holm":
+        steps = np.maximum.accumulate((num_tests - np.arange(num_tests)) * p_values[order])
+    elif method == "bh":
+        steps = np.minimum.accumulate((num_tests / np.arange(1, num_tests + 1) * p_values[order])[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown correction {method!r}, expected 'holm' or 'bh'")
+    adjusted[order] = np.minimum(steps, 1)
+    return adjusted
+
+
+def compare_samples(simulated, observed, label=""):
+    """
+    Run every test on the columns both samples have.
+
+    Args:
+        simulated (dict): Named columns from the engine.
+        observed (dict): Named columns to compare against (data or a reference engine).
+        label (str): Group name stored in the report, e.g. the bus_time.
+
+    Returns:
+        pd.DataFrame: One row per column and test, with the sample sizes "n_simulated" and "n_observed".
+    """
+    names = [name for name in observed if name in simulated]
+    x = np.column_stack([simulated[name] for name in names])
+    y = np.column_stack([observed[name] for name in names])
+    (mean_stat, mean_p), (spread_stat, spread_p) = moment_columns(x, y)
+    results = {"ks": ks_columns(x, y), "ad": ad_columns(x, y), "mean": (mean_stat, mean_p),
+               "spread": (spread_stat, spread_p)}
+
+    return pd.DataFrame([
+        {"group": label, "n_simulated": len(x), "n_observed": len(y), "column": name, "test": test,
+         "statistic": statistic[i], "p_value": p_value[i]}
+        for test, (statistic, p_value) in results.items() for i, name in enumerate(names)
+    ])
+
+
+def validation_report(comparisons, alpha=0.05, correction="holm", tests=None, min_samples=MIN_SAMPLES):
+    """
+    Combine comparisons into one report with corrected p-values.
+
+    Groups with fewer than min_samples observed trips, and tests that could not be run, are marked
+    "skipped" and left out of the correction; they count as neither passed nor failed.
+
+    Args:
+        comparisons (list): DataFrames from compare_samples.
+        alpha (float): Significance level after correction.
+        correction (str): "holm" or "bh", applied across all tests in the report.
+        tests (list): Tests to keep, default TESTS.
+        min_samples (int): Smallest observed group that is tested.
+
+    Returns:
+        tuple: (report DataFrame with "p_adjusted" and "status" ("passed", "failed" or "skipped"),
+            overall pass flag: at least one test run and none failed)
+    """
+    report = pd.concat(comparisons, ignore_index=True)
+    report = report[report["test"].isin(tests or TESTS)].reset_index(drop=True)
+    underpowered = report["n_observed"] < min_samples
+    report["p_adjusted"] = adjust_p_values(report["p_value"].where(~underpowered).to_numpy(), method=correction)
+    report["status"] = np.where(report["p_adjusted"].isna(), "skipped",
+                                np.where(report["p_adjusted"] < alpha, "failed", "passed"))
+    status = report["status"].value_counts()
+    return report, bool(status.get("passed", 0) > 0 and status.get("failed", 0) == 0)
+
+
+def validate_against_observed(num_trips=5000, file_path=DATA_PATH, seed=0, **kwargs):
+    """
+    Compare ShuttleBusSimulationByTime and the final/real.py model with the observed per-bus_time data.
+    Most bus_times have only two or three trips, so both engines are also compared with all observed
+    trips pooled (group "all"). For ShuttleBusSimulationByTime the pooled sample mixes the bus_times
+    in the observed proportions.
+
+    Returns:
+        dict: engine name -> (report, passed)
+    """
+    observed = observed_samples(file_path)
+    by_time = by_time_samples(num_trips, file_path=file_path, seed=seed)
+    real = batch_samples(num_trips, seed=seed)
+    pooled = {name: np.concatenate([columns[name] for columns in observed.values()]) for name in real}
+
+    num_observed = {bus_time: len(next(iter(columns.values()))) for bus_time, columns in observed.items()}
+    total_observed = sum(num_observed.values())
+    by_time_pooled = {name: np.concatenate([
+        by_time[bus_time][name][:round(num_trips * count / total_observed)]
+        for bus_time, count in num_observed.items()
+    ]) for name in by_time[next(iter(observed))]}
+    return {
+        "ShuttleBusSimulationByTime": validation_report(
+            [compare_samples(by_time[bus_time], observed[bus_time], bus_time) for bus_time in observed]
+            + [compare_samples(by_time_pooled, pooled, "all")], **kwargs),
+        "real": validation_report(
+            [compare_samples(real, observed[bus_time], bus_time) for bus_time in observed]
+            + [compare_samples(real, pooled, "all")], **kwargs),
+    }
+
+
+def validate_against_reference(engines, num_trips=2000, seed=0, **kwargs):
+    """
+    Gate fast-path engines: compare each engine's trips with the reference ShuttleBusSimulation.
+
+    Args:
+        engines (dict): name -> function(num_trips, seed) returning named columns.
+
+    Returns:
+        dict: engine name -> (report, passed)
+    """
+    reference = reference_samples(num_trips, seed=seed)
+    return {name: validation_report([compare_samples(engine(num_trips, seed + 1), reference, name)], **kwargs)
+            for name, engine in engines.items()}
+
+
+if __name__ == "__main__":
+    # Exact check first: identical inputs must give identical trips on every backend
+    check_backends(random_state=0)
+    print("===== 백엔드 정확성 검사: 통과 (numpy, jit == ShuttleBusSimulation.simulate_stop) =====")
+
+    engines = {
+        "batch (numpy)": lambda num_trips, seed: batch_samples(num_trips, seed=seed, backend="numpy"),
+        "batch (jit)": lambda num_trips, seed: batch_samples(num_trips, seed=seed, backend="jit"),
+    }
+    reports = {**validate_against_observed(), **validate_against_reference(engines)}
+
+    for name, (report, passed) in reports.items():
+        status = report["status"].value_counts()
+        failed = report[report["status"] == "failed"]
+        print(f"\n===== {name}: {'통과' if passed else '실패'} (통과 {status.get('passed', 0)}, "
+              f"실패 {status.get('failed', 0)}, 생략 {status.get('skipped', 0)}) =====")
+        groups = report.groupby("group", sort=False)[["n_simulated", "n_observed"]].first()
+        print(groups.to_string())
+        if len(failed):
+            print(failed.to_string(index=False))
@@ -105,6 +105,49 @@ class ShuttleBusSimulationByTime:
 
             self.results[time_slot] = simulation_results
 
+    def run_batch(self, time_slot, num_simulations=None, random_state=None):
+        """
+        한 시간대의 시뮬레이션을 복제 횟수만큼 한 번에(벡터화) 실행.
+        ShuttleBusSimulation.run과 같은 모델이며, 평균 대신 복제별 결과를 반환합니다.
+
+        Args:
+            time_slot (str): 시간대 (예: "1130i").
+            num_simulations (int): 복제 횟수. 없으면 self.num_simulations.
+            random_state: 시드 또는 numpy Generator.
+
+        Returns:
+            dict: "boardings", "alightings", "stop_times", "overflows"는 (복제 수, 정류장 수),
+                "travel_times"는 (복제 수, 정류장 수 - 1) 배열.
+        """
+        num_simulations = num_simulations or self.num_simulations
+        rng = np.random.default_rng(random_state)
+        arrival_rates = np.asarray(self.arrival_rates[time_slot], dtype=float)
+        depart_rates = np.asarray(self.depart_rates[time_slot], dtype=float)
+        stop_means, stop_stds = np.asarray(self.stop_times[time_slot], dtype=float).T
+        travel_means, travel_stds = np.asarray(self.travel_times[time_slot], dtype=float).T
+        num_stops = len(arrival_rates)
+
+        arrivals = rng.poisson(arrival_rates, size=(num_simulations, num_stops))
+        departs = rng.poisson(depart_rates, size=(num_simulations, num_stops))
+        results = {
+            "boardings": np.zeros((num_simulations, num_stops), dtype=int),
+            "alightings": np.zeros((num_simulations, num_stops), dtype=int),
+            "stop_times": np.maximum(0, rng.normal(stop_means, stop_stds, size=(num_simulations, num_stops))),
+            "travel_times": np.maximum(0, rng.normal(travel_means, travel_stds, size=(num_simulations, len(travel_means)))),
+            "overflows": np.zeros((num_simulations, num_stops), dtype=int),
+        }
+
+        passengers = np.zeros(num_simulations, dtype=int)
+        for i in range(num_stops):
+            results["overflows"][:, i] = np.maximum(0, passengers + arrivals[:, i] - self.bus_capacity)
+            results["boardings"][:, i] = arrivals[:, i] - results["overflows"][:, i]
+            passengers += results["boardings"][:, i]
+
+            results["alightings"][:, i] = np.minimum(passengers, departs[:, i])
+            passengers -= results["alightings"][:, i]
+
+        return results
+
     def display_results(self):
         for time_slot, results in self.results.items():
             print(f"\n===== {time_slot} 시간대 결과 =====")